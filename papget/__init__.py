@@ -1 +1,2 @@
 from .papget import *
+from .batch import *
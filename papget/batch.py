@@ -0,0 +1,196 @@
+# !/usr/bin/env python2
+# -*- coding: utf-8 -*-
+""" Downloading many papers concurrently from within Python
+"""
+
+from __future__ import print_function, division, unicode_literals
+
+import os
+import threading
+import time
+from collections import namedtuple
+
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
+
+from . import doi, papget
+
+__all__ = ['Result', 'fetch', 'fetch_many']
+
+Result = namedtuple('Result', ['doi', 'provider', 'url', 'filename',
+                               'size', 'timings', 'error'])
+""" Outcome of a single download
+
+Attributes:
+    doi (str):      DOI or URL as passed in
+    provider (str): Name of the provider used last
+    url (str):      Target the DOI resolved to
+    filename (str): Path of the PDF or ``None`` if the download failed
+    size (int):     Number of bytes written
+    timings (dict): Seconds spent in the ``resolve`` and ``download``
+                    phases and in ``total``
+    error (str):    Error message if the download failed
+"""
+
+def fetch(url, filename, browser=None, targets=None):
+    """ Download a single DOI, falling back to Sci-Hub
+
+    Errors are not raised but recorded in the result. If the
+    provider of the DOI fails or raises, Sci-Hub is tried instead.
+
+    Args:
+        url (str):
+                DOI in URL format
+        filename (str):
+                Where to store the PDF
+        browser (Optional[:class:`mechanize.Browser`]):
+                If no browser is provided, a new instance
+                will be created.
+        targets (Optional[dict]):
+                Cache mapping DOIs to the result of
+                :func:`papget.doi.get_target`
+
+    Returns:
+        (:class:`Result`)
+    """
+    browser = papget.Provider.get_browser(browser)
+    targets = {} if targets is None else targets
+    start = time.time()
+    timings = {}
+    provider = target = succ = None
+    errors = []
+    try:
+        if url not in targets:
+            targets[url] = doi.get_target(url, browser)
+        target, provider = targets[url]
+    except Exception as e:
+        errors.append('{}'.format(e))
+    timings['resolve'] = time.time() - start
+
+    if provider and provider is not papget.SciHub:
+        try:
+            succ = provider.papget(target, filename, browser)
+        except Exception as e:
+            errors.append('{}: {}'.format(provider.NAME, e))
+    if not succ:
+        provider = papget.SciHub
+        try:
+            succ = provider.papget(url, filename, browser)
+        except Exception as e:
+            errors.append('{}: {}'.format(provider.NAME, e))
+    timings['download'] = time.time() - start - timings['resolve']
+    # The browser would otherwise keep every response in memory
+    browser.clear_history()
+    timings['total'] = time.time() - start
+    size = os.path.getsize(succ) if succ else 0
+    error = None if succ else '; '.join(errors) or 'no PDF available'
+    return Result(doi=url,
+                  provider=provider.NAME,
+                  url=target,
+                  filename=succ or None,
+                  size=size,
+                  timings=timings,
+                  error=error)
+
+def fetch_many(urls, directory='.', workers=4, targets=None):
+    """ Download DOIs concurrently and yield results as they complete
+
+    Every worker thread uses its own browser, all of them sharing
+    the cookies of :data:`papget.papget.NETWORK`. The DOIs are
+    consumed lazily, so ``urls`` may be any iterable, e.g. a generator.
+
+    Args:
+        urls (iterable):
+                DOIs in URL format
+        directory (Optional[str]):
+                Directory the PDFs are stored in. File names are
+                derived by :func:`papget.doi.filename_from_doi`.
+        workers (Optional[int]):
+                Number of concurrent downloads
+        targets (Optional[dict]):
+                Cache mapping DOIs to the result of
+                :func:`papget.doi.get_target`
+
+    Yields:
+        (:class:`Result`) in order of completion
+
+    Raises:
+        Exception: whatever iterating over ``urls`` raises
+
+    Example:
+        >>> import shutil, tempfile
+        >>> tmp = tempfile.mkdtemp()
+        >>> class Stub(papget.Provider):
+        ...     NAME = 'Stub'
+        ...     @classmethod
+        ...     def papget(cls, url, filename, browser=None):
+        ...         if url == 'broken':
+        ...             raise AttributeError('no PDF link')
+        ...         time.sleep(0.2 if url == 'slow' else 0)
+        ...         with open(filename, 'wb') as pdf:
+        ...             pdf.write(b'%PDF')
+        ...         return filename
+        >>> targets = dict((u, (u, Stub)) for u in ['slow', 'fast', 'broken'])
+        >>> results = list(fetch_many(['slow', 'fast', 'broken'], tmp,
+        ...                           workers=3, targets=targets))
+        >>> print(results[-1].doi)
+        slow
+        >>> fast = [r for r in results if r.doi == 'fast'][0]
+        >>> print(os.path.basename(fast.filename))
+        fast.pdf
+        >>> fast.size, fast.error
+        (4, None)
+        >>> broken = [r for r in results if r.doi == 'broken'][0]
+        >>> print(broken.provider)
+        Sci-Hub
+        >>> broken.filename is None and 'Stub: no PDF link' in broken.error
+        True
+        >>> def dois():
+        ...     yield 'fast'
+        ...     raise ValueError('bad input')
+        >>> list(fetch_many(dois(), tmp, targets=targets))
+        Traceback (most recent call last):
+        ...
+        ValueError: bad input
+        >>> shutil.rmtree(tmp)
+    """
+    urls = iter(urls)
+    lock = threading.Lock()
+    stop = threading.Event()
+    results = Queue()
+    targets = {} if targets is None else targets
+
+    def work():
+        try:
+            browser = papget.Provider.get_browser()
+            while not stop.is_set():
+                with lock:
+                    url = next(urls, None)
+                if url is None:
+                    break
+                fn = os.path.join(directory, doi.filename_from_doi(url))
+                results.put(fetch(url, fn, browser, targets))
+        except Exception as e:
+            results.put(e)
+        finally:
+            results.put(None)
+
+    threads = [threading.Thread(target=work) for _ in range(workers)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    running = len(threads)
+    try:
+        while running:
+            result = results.get()
+            if result is None:
+                running -= 1
+            elif isinstance(result, Exception):
+                raise result
+            else:
+                yield result
+    finally:
+        stop.set()
@@ -0,0 +1,89 @@
+# !/usr/bin/env python2
+# -*- coding: utf-8 -*-
+""" Naming of downloaded files and info files for bibtex entries
+"""
+
+from __future__ import print_function, division, unicode_literals
+
+import datetime as dt
+import os
+
+import yaml
+
+def name_format(bib_name, style='shelah', ext='pdf'):
+    """ File name for the paper of a .bib file
+
+    Args:
+        bib_name (str):
+                Path of the .bib file
+        style (Optional[str]):
+                Naming style
+        ext (Optional[str]):
+                File extension
+
+    Returns:
+        str:    File name without directory
+
+    Example:
+        >>> print(name_format('/home/me/123-foo.bib', ext='info'))
+        123.info
+    """
+    fn = os.path.basename(bib_name)
+    nr = fn.split('-')[0]
+    return '{}.{}'.format(nr, ext)
+
+def info_record(doi, url, provider, network=None):
+    """ Description of a successful download as written to info files
+
+    Args:
+        doi (str):
+                DOI in URL format
+        url (str):
+                Target of the DOI
+        provider (str):
+                Name of the provider the PDF was downloaded from
+        network (Optional[str]):
+                Name of the network used
+
+    Returns:
+        dict
+
+    Example:
+        >>> d = info_record('https://doi.org/10.1109/5.771073',
+        ...                 'https://ieeexplore.ieee.org/document/771073/',
+        ...                 'Sci-Hub', 'TU Wien')
+        >>> sorted(d) == ['date', 'doi', 'network', 'note', 'provider',
+        ...               'short description', 'url']
+        True
+    """
+    d = dict(doi=doi,
+             url=url,
+             provider=provider,
+             note='automatically downloaded with '
+                  '<https://github.com/tim6her/papget/>')
+    if network:
+        d['network'] = network
+    d['date'] = dt.datetime.now().strftime('%Y-%m-%d')
+    desc = 'automatically downloaded by tim6her on {}, {}'
+    d['short description'] = desc.format(d['date'], url)
+    return d
+
+def write_info(d, filename):
+    """ Store a download record in the ``download`` section of an
+    info file, keeping all other sections
+
+    Args:
+        d (dict):
+                Record, see :func:`info_record`
+        filename (str):
+                Path of the info file
+    """
+    if os.path.isfile(filename):
+        with open(filename, 'r') as info:
+            d_info = yaml.safe_load(info) or {}
+    else:
+        d_info = {}
+    d_info['download'] = d
+    with open(filename, 'w') as info:
+        yaml.safe_dump(d_info, info,
+                       default_flow_style=False)
@@ -5,6 +5,8 @@
 
 from __future__ import unicode_literals, division, print_function
 
+import re
+
 import mechanize
 
 from . import papget
@@ -31,4 +33,48 @@ def resolve_doi(url, browser=None):
         browser.open(url)
     except mechanize.HTTPError:
         pass
+    browser.clear_history()
     return browser.geturl()
+
+def get_target(url, browser=None):
+    """ Resolve a DOI and find the provider responsible for its target
+
+    Args:
+        url (str):
+                DOI in URL format
+        browser (Optional[:class:`mechanize.Browser`]):
+                A :class:`mechanize.Browser` instance. If none is
+                provided a new browser will be created.
+
+    Returns:
+        tuple:  Target of DOI and the matching subclass of
+                :class:`papget.papget.Provider`. If no provider
+                matches, the DOI itself and
+                :class:`papget.papget.SciHub` are returned.
+    """
+    target = resolve_doi(url, browser)
+
+    for provider in papget.ALL_PROVIDERS:
+        if provider.RE_URL.search(target):
+            return target, provider
+    return url, papget.SciHub
+
+def filename_from_doi(url, ext='pdf'):
+    """ Derive a file name from a DOI
+
+    Args:
+        url (str):
+                DOI in URL format or plain DOI
+        ext (Optional[str]):
+                File extension
+
+    Returns:
+        str:    File name without any path separators
+
+    Example:
+        >>> print(filename_from_doi('https://doi.org/10.1109/5.771073'))
+        10.1109_5.771073.pdf
+    """
+    doi = re.sub(r'^https?://(dx\.)?doi\.org/', '', url)
+    doi = re.sub(r'[^\w.\-]+', '_', doi)
+    return '{}.{}'.format(doi, ext)
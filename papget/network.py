@@ -0,0 +1,116 @@
+# !/usr/bin/env python2
+# -*- coding: utf-8 -*-
+""" Named network profiles keeping cookies and proxy settings
+between runs, e.g. for access via an institution's proxy login.
+"""
+
+from __future__ import print_function, division, unicode_literals
+
+import os
+
+import yaml
+from mechanize import LoadError, LWPCookieJar
+
+PROFILE_DIR = os.path.join(os.path.expanduser('~'), '.papget', 'networks')
+""" (str): Directory network profiles are stored in by default
+"""
+
+class NetworkProfile(object):
+    """ Cookie jar and proxy settings of a network stored on disk
+
+    Session cookies are stored as well, so that authenticated
+    sessions survive until the publisher expires them.
+
+    Args:
+        name (str):
+                Name of the network, e.g. ``'TU Wien'``
+        directory (Optional[str]):
+                Directory containing all profiles. Defaults to
+                :data:`PROFILE_DIR`.
+
+    Example:
+        >>> import shutil, tempfile
+        >>> tmp = tempfile.mkdtemp()
+        >>> profile = NetworkProfile('TU Wien', tmp)
+        >>> profile.proxies['https'] = 'proxy.example.org:3128'
+        >>> profile.save()
+        >>> NetworkProfile('TU Wien', tmp).proxies == profile.proxies
+        True
+        >>> oct(os.stat(profile.settings_file).st_mode & 0o777)[-3:]
+        '600'
+        >>> with open(profile.cookiejar.filename, 'w') as cookies:
+        ...     _ = cookies.write('garbage')
+        >>> NetworkProfile('TU Wien', tmp)
+        Traceback (most recent call last):
+        ...
+        ValueError: Corrupt network profile TU Wien: ...
+        >>> shutil.rmtree(tmp)
+    """
+    def __init__(self, name, directory=None):
+        self.name = name
+        self.path = os.path.join(directory or PROFILE_DIR, name)
+        self.cookiejar = LWPCookieJar(os.path.join(self.path, 'cookies.txt'))
+        self.proxies = {}
+        self.load()
+
+    def __repr__(self):
+        return self.name
+
+    @property
+    def settings_file(self):
+        """ (str): Path of the YAML file holding the proxy settings
+        """
+        return os.path.join(self.path, 'settings.yaml')
+
+    def load(self):
+        """ Read cookies and settings from disk if present
+
+        Raises:
+            ValueError: if a file of the profile is corrupt
+        """
+        if os.path.isfile(self.cookiejar.filename):
+            try:
+                self.cookiejar.load(ignore_discard=True)
+            except LoadError as e:
+                msg = 'Corrupt network profile {}: {}'
+                raise ValueError(msg.format(self.name, e))
+        if os.path.isfile(self.settings_file):
+            with open(self.settings_file) as settings:
+                try:
+                    d = yaml.safe_load(settings) or {}
+                except yaml.YAMLError as e:
+                    msg = 'Corrupt settings file {}: {}'
+                    raise ValueError(msg.format(self.settings_file, e))
+            self.proxies = d.get('proxies') or {}
+
+    def save(self):
+        """ Write cookies and settings to disk
+
+        The profile is only accessible by the current user, as it may
+        contain session cookies and proxy credentials.
+        """
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path, 0o700)
+        os.chmod(self.path, 0o700)
+        self.cookiejar.save(ignore_discard=True)
+        os.chmod(self.cookiejar.filename, 0o600)
+        fd = os.open(self.settings_file,
+                     os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as settings:
+            yaml.safe_dump(dict(proxies=self.proxies), settings,
+                           default_flow_style=False)
+        os.chmod(self.settings_file, 0o600)
+
+    def configure(self, browser):
+        """ Let a browser use the cookies and proxies of this profile
+
+        Args:
+            browser (:class:`mechanize.Browser`)
+
+        Returns:
+            (:class:`mechanize.Browser`)
+        """
+        browser.set_cookiejar(self.cookiejar)
+        if self.proxies:
+            browser.set_proxies(self.proxies)
+        return browser
@@ -6,11 +6,103 @@ Springer.
 
 from __future__ import print_function, division, unicode_literals
 
+import os
 import re
+import threading
+from contextlib import contextmanager
 
 from bs4 import BeautifulSoup
 import requests
-from mechanize import Browser
+from mechanize import Browser, Cookie
+
+CHUNK_SIZE = 64 * 1024
+""" (int): Number of bytes read at once when downloading a PDF
+"""
+SOUP_FACTOR = 10
+""" (int): Estimated size of a parsed page tree relative to its
+        HTML source
+"""
+
+class MemoryBudget(object):
+    """ Limit on the number of bytes held by in-flight downloads
+    and parsed pages across all threads
+
+    If the budget is exhausted, new reservations block until enough
+    memory is released. A single reservation larger than the limit
+    is granted once nothing else is reserved.
+
+    Args:
+        limit (Optional[int]):
+                Number of bytes available. ``None`` means unlimited.
+
+    Example:
+        >>> budget = MemoryBudget(100)
+        >>> with budget.reserve(10) as grow:
+        ...     grow(50)
+        ...     budget.in_use
+        60
+        >>> budget.in_use, budget.high_water
+        (0, 60)
+
+        A second reservation waits until the first one is released:
+
+        >>> import time
+        >>> events = []
+        >>> def second():
+        ...     with budget.reserve(60):
+        ...         events.append('second reserved')
+        >>> with budget.reserve(60):
+        ...     worker = threading.Thread(target=second)
+        ...     worker.start()
+        ...     time.sleep(0.1)
+        ...     events.append('first released')
+        >>> worker.join()
+        >>> print(', '.join(events))
+        first released, second reserved
+    """
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.in_use = 0
+        self.high_water = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def reserve(self, size):
+        """ Context manager reserving ``size`` bytes while active
+
+        Yields a function that adds bytes to the reservation once
+        the actual size is known. Growing never blocks.
+        """
+        reserved = [size]
+
+        def grow(more):
+            with self._cond:
+                reserved[0] += more
+                self.in_use += more
+                self.high_water = max(self.high_water, self.in_use)
+
+        with self._cond:
+            while (self.limit and self.in_use
+                   and self.in_use + size > self.limit):
+                self._cond.wait()
+            self.in_use += size
+            self.high_water = max(self.high_water, self.in_use)
+        try:
+            yield grow
+        finally:
+            with self._cond:
+                self.in_use -= reserved[0]
+                self._cond.notify_all()
+
+BUDGET = MemoryBudget()
+""" (:class:`MemoryBudget`): Budget shared by all providers. Set
+        ``BUDGET.limit`` to restrict memory usage.
+"""
+NETWORK = None
+""" (:class:`papget.network.NetworkProfile`): Profile applied to all
+        browsers created by :func:`Provider.get_browser` and to PDF
+        downloads. ``None`` uses a fresh session every time.
+"""
 
 class Provider(object):
     """ Class representing the providers of papers
@@ -30,6 +122,37 @@ class Provider(object):
     def __repr__(self):
         return self.NAME
 
+    @classmethod
+    @contextmanager
+    def page(cls, url, browser=None):
+        """ Context manager providing a parsed version of the HTML
+        source of an URL
+
+        The page is fetched once :data:`BUDGET` permits another chunk
+        to be held in memory. The source and the estimated size of the
+        tree stay reserved until the context is left. The history of
+        the browser is cleared, so that it does not keep old pages.
+
+        Args:
+            url (str):
+                    URL pointing to desired webpage
+            browser (Optional[:class:`mechanize.Browser`]):
+                    If no browser is provided, a new instance
+                    will be created.
+
+        Yields:
+            (:class:`bs4.BeautifulSoup`)
+                Parsed version of HTML source
+        """
+        browser = cls.get_browser(browser)
+        with BUDGET.reserve(CHUNK_SIZE) as grow:
+            browser.open(url)
+            html = browser.response().read()
+            # The browser would otherwise keep every page in memory
+            browser.clear_history()
+            grow(len(html) * (1 + SOUP_FACTOR))
+            yield BeautifulSoup(html, 'html5lib')
+
     @classmethod
     def get_soup(cls, url, browser=None):
         """ Get a parsed version of the HTML source of an URL
@@ -44,14 +167,16 @@ class Provider(object):
         Returns:
             (:class:`bs4.BeautifulSoup`)
                 Parsed version of HTML source
+
+        Note:
+            The page is accounted in :data:`BUDGET` while parsing
+            only. Use :func:`page` to keep it reserved while in use.
         """
-        browser = cls.get_browser(browser)
-        browser.open(url)
-        html = browser.response().read()
-        return BeautifulSoup(html, 'html5lib')
+        with cls.page(url, browser) as soup:
+            return soup
 
     @classmethod
-    def need_to_pay(cls, url, browser=None):
+    def need_to_pay(cls, url, browser=None, soup=None):
         """ Check whether one needs to pay for PDF download
 
         Args:
@@ -60,6 +185,9 @@ class Provider(object):
             browser (Optional[:class:`mechanize.Browser`]):
                     If no browser is provided, a new instance
                     will be created.
+            soup (Optional[:class:`bs4.BeautifulSoup`]):
+                    Parsed page of ``url``. If none is provided,
+                    the page is fetched.
         """
         pass
 
@@ -75,15 +203,86 @@ class Provider(object):
                     will be created.
         """
         browser = cls.get_browser(browser)
-        if not cls.need_to_pay(url, browser):
-            link = cls.get_pdf_url(url, browser)
-            req = requests.get(link)
-            with open(filename, 'wb') as pdf:
-                pdf.write(req.content)
-            return filename
+        with cls.page(url, browser) as soup:
+            if cls.need_to_pay(url, browser, soup):
+                return
+            link = cls.get_pdf_url(url, browser, soup)
+        cls.download(link, filename, browser)
+        return filename
+
+    @staticmethod
+    def download(link, filename, browser=None, check=None, markers=()):
+        """ Stream a resource to disk chunk by chunk
+
+        The transfer is started only once :data:`BUDGET` permits
+        another chunk to be held in memory. The resource is written to
+        ``filename + '.part'``, which replaces ``filename`` only once
+        the transfer is complete and accepted by ``check``. Thus an
+        existing file survives failed downloads.
+
+        Args:
+            link (str):
+                    URL of the resource
+            filename (str):
+                    Where to store the resource
+            browser (Optional[:class:`mechanize.Browser`]):
+                    If provided, its cookies are sent along and
+                    cookies set during the transfer, including
+                    redirects, are stored in its cookie jar.
+                    Proxies are taken from :data:`NETWORK`.
+            check (Optional[callable]):
+                    Called with the number of bytes and the set of
+                    ``markers`` found in the resource. Raise an
+                    exception to reject the resource.
+            markers (Optional[list]):
+                    Byte strings searched for in the whole resource
+
+        Returns:
+            int:    Number of bytes written
+        """
+        jar = getattr(browser, 'cookiejar', None)
+        cookies = requests.cookies.RequestsCookieJar()
+        for c in jar or []:
+            cookies.set(c.name, c.value, domain=c.domain, path=c.path,
+                        secure=c.secure)
+        proxies = NETWORK.proxies if NETWORK else None
+        part = filename + '.part'
+        overlap = max([len(m) for m in markers] or [1]) - 1
+        size = 0
+        found = set()
+        tail = b''
+        try:
+            with BUDGET.reserve(CHUNK_SIZE):
+                req = requests.get(link, stream=True, cookies=cookies,
+                                   proxies=proxies)
+                with open(part, 'wb') as pdf:
+                    for chunk in req.iter_content(CHUNK_SIZE):
+                        # Keep the end of the last chunk to find markers
+                        # spanning two chunks
+                        window = tail + chunk
+                        found.update(m for m in markers if m in window)
+                        tail = window[-overlap:] if overlap else b''
+                        size += len(chunk)
+                        pdf.write(chunk)
+            if jar is not None:
+                for response in req.history + [req]:
+                    for c in response.cookies:
+                        jar.set_cookie(Cookie(
+                            c.version, c.name, c.value, c.port,
+                            c.port_specified, c.domain, c.domain_specified,
+                            c.domain_initial_dot, c.path, c.path_specified,
+                            c.secure, c.expires, c.discard, c.comment,
+                            c.comment_url, {}, c.rfc2109))
+            if check:
+                check(size, found)
+            os.rename(part, filename)
+        finally:
+            if os.path.isfile(part):
+                os.remove(part)
+        return size
 
     @classmethod
-    def get_pdf_url(cls, url, browser=None):
+    def get_pdf_url(cls, url, browser=None, soup=None):
         """ Get URL of PDF resource
 
         Args:
@@ -92,6 +291,9 @@ class Provider(object):
             browser (Optional[:class:`mechanize.Browser`]):
                     If no browser is provided, a new instance
                     will be created.
+            soup (Optional[:class:`bs4.BeautifulSoup`]):
+                    Parsed page of ``url``. If none is provided,
+                    the page is fetched.
         """
         pass
 
@@ -99,6 +301,8 @@ class Provider(object):
     def get_browser(browser=None):
         """ Create new browser if none is present.
 
+        New browsers share the cookies and proxies of :data:`NETWORK`.
+
         Returns:
             (:class:`mechanize.Browser`)
         """
@@ -110,6 +314,8 @@ class Provider(object):
                 ('Mozilla/5.0 (X11; U; Linux i686; en-US; '
                 'rv:1.9.0.1) Gecko/2008071615 '
                 'Fedora/3.0.1-1.fc9 Firefox/3.0.1'))]
+            if NETWORK:
+                NETWORK.configure(browser)
 
         return browser
 
@@ -136,13 +342,13 @@ class Springer(Provider):
     """
 
     @classmethod
-    def need_to_pay(cls, url, browser=None):
-        soup = cls.get_soup(url, browser)
+    def need_to_pay(cls, url, browser=None, soup=None):
+        soup = soup or cls.get_soup(url, browser)
         return soup.find('span', attrs={'class': 'buybox__buy'})
 
     @classmethod
-    def get_pdf_url(cls, url, browser=None):
-        soup = cls.get_soup(url, browser)
+    def get_pdf_url(cls, url, browser=None, soup=None):
+        soup = soup or cls.get_soup(url, browser)
         pdf = soup.find('a',
                         title=('Download this book in PDF '
                         'format'))
@@ -176,13 +382,13 @@ class Cammbridge(Provider):
     RE_URL = re.compile('www.cambridge.org')
 
     @classmethod
-    def need_to_pay(cls, url, browser=None):
-        soup = cls.get_soup(url, browser)
+    def need_to_pay(cls, url, browser=None, soup=None):
+        soup = soup or cls.get_soup(url, browser)
         return soup.find('a', string='Get access')
 
     @classmethod
-    def get_pdf_url(cls, url, browser=None):
-        soup = cls.get_soup(url, browser)
+    def get_pdf_url(cls, url, browser=None, soup=None):
+        soup = soup or cls.get_soup(url, browser)
         pdf = soup.find('a',
                         attrs={'aria-label': 'Download PDF'})
         link = pdf['href']
@@ -206,20 +412,24 @@ class Ams(Provider):
     RE_URL = re.compile('www.ams.org')
 
     @classmethod
-    def need_to_pay(cls, url, browser=None):
-        soup = cls.get_soup(url, browser)
+    def need_to_pay(cls, url, browser=None, soup=None):
+        soup = soup or cls.get_soup(url, browser)
         return soup.find('div',
                          id='buy_in_amsbookstore_div')
 
     @classmethod
-    def get_pdf_url(cls, url, browser=None):
+    def get_pdf_url(cls, url, browser=None, soup=None):
         browser = cls.get_browser(browser)
-        soup = cls.get_soup(url, browser)
+        soup = soup or cls.get_soup(url, browser)
         pdf = soup.find('a', string='Full-text PDF')
         link = pdf['href']
         browser.open(url)
-        browser.open(link)
-        return browser.geturl()
+        browser.clear_history()
+        # Only follow the redirects, the PDF is downloaded by download
+        response = browser.open_novisit(link)
+        target = response.geturl()
+        response.close()
+        return target
 
 class SciHub(Provider):
     """ Provider implementation for Sci-Hub
@@ -231,21 +441,21 @@ class SciHub(Provider):
     RE_URL = re.compile('sci-hub.tw')
 
     @classmethod
-    def need_to_pay(cls, url, browser=None):
+    def need_to_pay(cls, url, browser=None, soup=None):
         return False
 
     @classmethod
-    def get_pdf_url(cls, url, browser=None):
+    def get_pdf_url(cls, url, browser=None, soup=None):
         doi = re.match(r'http://dx.doi.org/(.*)', url).group(1)
         scihub = 'http://sci-hub.tw/'
         browser = cls.get_browser(browser)
-        soup = cls.get_soup(scihub + doi, browser)
-        pdf = soup.find('div',
-                        attrs={'class': 'button',
-                               'id': 'save'}
-                       )
+        with cls.page(scihub + doi, browser) as soup:
+            pdf = soup.find('div',
+                            attrs={'class': 'button',
+                                   'id': 'save'}
+                           )
+            link = pdf.p.a['onclick']
 
-        link = pdf.p.a['onclick']
         link = re.match(r'.*?=\'(.*)\'', link).group(1)
         return link
 
@@ -254,16 +464,19 @@ class SciHub(Provider):
         browser = cls.get_browser(browser)
         if not cls.need_to_pay(url, browser):
             link = cls.get_pdf_url(url, browser)
-            req = requests.get(link)
-            if 'CaptchaRedirect' in req.text:
-                raise RuntimeError('Captach encountered')
-            content = req.content
-            if len(content) < 3000:
-                msg = 'File size too small to be valid PDF: {}'
-                raise RuntimeError(msg.format(len(content)))
-
-            with open(filename, 'wb') as pdf:
-                pdf.write(req.content)
+            cls.download(link, filename, browser, cls.check_pdf,
+                         [b'CaptchaRedirect'])
             return filename
 
+    @staticmethod
+    def check_pdf(size, found):
+        """ Reject CAPTCHA pages and responses too small to be a PDF,
+        see :func:`Provider.download`
+        """
+        if b'CaptchaRedirect' in found:
+            raise RuntimeError('Captach encountered')
+        if size < 3000:
+            msg = 'File size too small to be valid PDF: {}'
+            raise RuntimeError(msg.format(size))
+
 ALL_PROVIDERS = [Springer, Cammbridge, Ams]
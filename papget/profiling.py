@@ -0,0 +1,173 @@
+# !/usr/bin/env python2
+# -*- coding: utf-8 -*-
+""" Profiling runs to find out where time is spent, e.g. parsing
+HTML, writing YAML or waiting for the network.
+"""
+
+from __future__ import print_function, division, unicode_literals
+
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+CATEGORIES = [
+    ('network', ('socket', 'ssl', 'httplib', 'http.client', 'urllib3')),
+    ('html parsing', ('html5lib', 'bs4')),
+    ('yaml', ('yaml',)),
+    ('bibtexparser', ('bibtexparser',)),
+    ('waiting', ('threading', 'queue', 'Queue', 'selectors',
+                 'socketserver', 'SocketServer')),
+]
+""" (list): Pairs of category name and the modules and packages
+        belonging to it. The innermost frame of a stack that matches
+        decides its category.
+"""
+
+class Sampler(object):
+    """ Periodically records the stacks of all other threads
+
+    Args:
+        interval (Optional[float]):
+                Seconds between two samples
+
+    Example:
+        >>> sampler = Sampler(0.001)
+        >>> sampler.start()
+        >>> worker = threading.Thread(target=time.sleep, args=(0.05,))
+        >>> worker.start(); worker.join()
+        >>> sampler.stop()
+        >>> sum(sampler.stacks.values()) > 0
+        True
+    """
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """ Start sampling in a background thread
+        """
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """ Stop sampling and wait for the background thread
+        """
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        me = threading.current_thread().ident
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident != me:
+                    self.stacks[stack(frame)] += 1
+
+def stack(frame):
+    """ Frames from the outermost to ``frame`` as a tuple of
+    ``(module, function)`` pairs, where ``module`` is the dotted
+    name of the module, e.g. ``yaml.emitter``
+    """
+    frames = []
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '?')
+        frames.append((module, frame.f_code.co_name))
+        frame = frame.f_back
+    return tuple(reversed(frames))
+
+def category(frames):
+    """ Category of a stack according to :data:`CATEGORIES`
+
+    Example:
+        >>> print(category([('__main__', 'main'),
+        ...                 ('yaml', 'safe_dump'),
+        ...                 ('http.client', 'readinto')]))
+        network
+        >>> print(category([('bs4.element', 'find')]))
+        html parsing
+    """
+    for module, _ in reversed(frames):
+        for name, modules in CATEGORIES:
+            if any(module == m or module.startswith(m + '.')
+                   for m in modules):
+                return name
+    return 'other'
+
+def write_collapsed(stacks, filename):
+    """ Write stacks in the collapsed format read by ``flamegraph.pl``
+    and speedscope. Frames are named ``module:function``.
+    """
+    with open(filename, 'w') as out:
+        for frames, count in sorted(stacks.items()):
+            line = ';'.join('{}:{}'.format(module, func)
+                            for module, func in frames)
+            out.write('{} {}\n'.format(line, count))
+
+def write_report(profiler, sampler, wall, filename):
+    """ Write the wall-clock breakdown and the CPU profile sorted by
+    cumulative time
+    """
+    total = sum(sampler.stacks.values())
+    breakdown = Counter()
+    for frames, count in sampler.stacks.items():
+        breakdown[category(frames)] += count
+
+    with open(filename, 'w') as out:
+        out.write('Wall-clock time: {:.2f} s\n\n'.format(wall))
+        out.write('Breakdown of {} samples of all threads:\n'.format(total))
+        for name, count in breakdown.most_common():
+            out.write('  {:<15}{:6.1f}%\n'.format(
+                name, 100 * count / max(total, 1)))
+        out.write('\nCPU profile of the calling thread:\n')
+        stats = pstats.Stats(profiler, stream=out)
+        stats.sort_stats('cumulative').print_stats()
+
+@contextmanager
+def profile(prefix, interval=0.005):
+    """ Profile the enclosed block
+
+    Writes ``<prefix>.txt`` containing a wall-clock breakdown by
+    :data:`CATEGORIES` and a per-function CPU profile as well as
+    ``<prefix>.collapsed`` containing the sampled stacks for
+    flamegraphs.
+
+    Note:
+        The CPU profile covers the calling thread only, while the
+        samples include worker threads, e.g. of
+        :func:`papget.batch.fetch_many`.
+
+    Args:
+        prefix (str):
+                Path of the reports without extension
+        interval (Optional[float]):
+                Seconds between two stack samples
+
+    Example:
+        >>> import shutil, tempfile
+        >>> tmp = tempfile.mkdtemp()
+        >>> with profile(os.path.join(tmp, 'run')):
+        ...     time.sleep(0.05)
+        >>> sorted(os.listdir(tmp))
+        ['run.collapsed', 'run.txt']
+        >>> shutil.rmtree(tmp)
+    """
+    profiler = cProfile.Profile()
+    sampler = Sampler(interval)
+    sampler.start()
+    start = time.time()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        wall = time.time() - start
+        sampler.stop()
+        write_report(profiler, sampler, wall, prefix + '.txt')
+        write_collapsed(sampler.stacks, prefix + '.collapsed')
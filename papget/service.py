@@ -0,0 +1,329 @@
+# !/usr/bin/env python2
+# -*- coding: utf-8 -*-
+""" A long-running service that keeps a warm browser and accepts
+download jobs over a local HTTP/JSON API.
+
+The API understands the following requests:
+
+``POST /jobs``
+    Submit a job. The body is a JSON object (``Content-Type:
+    application/json``) with the key ``directory`` (where to store the
+    PDFs) and the optional keys ``dois`` (list of DOIs in URL format)
+    and ``bibs`` (list of paths to .bib files) as well as ``overwrite``
+    (whether existing PDFs are downloaded again, defaults to true).
+    Paths must be absolute, as the service does not know the client's
+    working directory. For entries of .bib files an info file is
+    written like ``pap-get.py`` does.
+``GET /jobs``
+    List all jobs.
+``GET /jobs/<id>``
+    Status and results of a single job.
+"""
+
+from __future__ import print_function, division, unicode_literals
+
+import itertools
+import json
+import os
+import threading
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from Queue import Queue
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from queue import Queue
+
+import bibtexparser as bibtex
+
+from . import batch, bib, doi, papget
+
+try:
+    STRING_TYPES = (str, unicode)
+except NameError:
+    STRING_TYPES = (str,)
+
+HOST = '127.0.0.1'
+""" (str): Default address the service listens on
+"""
+PORT = 8473
+""" (int): Default port the service listens on
+"""
+
+class Job(object):
+    """ A batch of downloads submitted to the :class:`Service`
+
+    Args:
+        id (int):
+                Identifier of the job
+        downloads (list):
+                Triples of DOI, file name to download to and info
+                file to write (or ``None``)
+        overwrite (Optional[bool]):
+                Whether existing PDFs are downloaded again
+
+    Example:
+        >>> job = Job(1, [('https://doi.org/10.1109/5.771073',
+        ...                '10.1109_5.771073.pdf', None)])
+        >>> print(job.to_dict()['status'])
+        queued
+    """
+    def __init__(self, id, downloads, overwrite=True):
+        self.id = id
+        self.downloads = downloads
+        self.overwrite = overwrite
+        self.status = 'queued'
+        self.results = []
+        self.error = None
+
+    def to_dict(self):
+        """ JSON serializable representation of the job
+        """
+        return dict(id=self.id,
+                    status=self.status,
+                    total=len(self.downloads),
+                    done=len(self.results),
+                    results=list(self.results),
+                    error=self.error)
+
+class Service(object):
+    """ Keeps a browser and resolved DOIs in memory and processes
+    submitted jobs one after the other in a background thread.
+
+    Args:
+        browser (Optional[:class:`mechanize.Browser`]):
+                If no browser is provided, a new instance
+                will be created.
+
+    Example:
+        >>> service = Service()
+        >>> job = service.submit(dois=['https://doi.org/10.1109/5.771073'],
+        ...                      directory='papers')
+        >>> job.downloads[0][1] == os.path.join('papers',
+        ...                                     '10.1109_5.771073.pdf')
+        True
+        >>> service.get(job.id) is job
+        True
+    """
+    def __init__(self, browser=None):
+        self.browser = papget.Provider.get_browser(browser)
+        self.targets = {}
+        self.jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._queue = Queue()
+        self._worker = None
+
+    def start(self):
+        """ Start processing jobs in a background thread
+        """
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run)
+            self._worker.daemon = True
+            self._worker.start()
+
+    def submit(self, dois=(), bibs=(), directory='.', overwrite=True):
+        """ Queue a new job
+
+        Args:
+            dois (Optional[list]):
+                    DOIs in URL format
+            bibs (Optional[list]):
+                    Paths to .bib files; every entry with an
+                    ``url`` field is downloaded
+            directory (Optional[str]):
+                    Directory the PDFs and info files are stored in,
+                    named by :func:`papget.bib.name_format`
+            overwrite (Optional[bool]):
+                    Whether existing PDFs are downloaded again
+
+        Returns:
+            (:class:`Job`)
+        """
+        downloads = [(url, os.path.join(directory,
+                                        doi.filename_from_doi(url)), None)
+                     for url in dois]
+        for f in bibs:
+            with open(f) as fin:
+                entries = bibtex.load(fin).entries
+            fn = os.path.join(directory, bib.name_format(f))
+            info = os.path.join(directory, bib.name_format(f, ext='info'))
+            downloads.extend((e['url'], fn, info)
+                             for e in entries if 'url' in e)
+
+        with self._lock:
+            job = Job(next(self._ids), downloads, overwrite)
+            self.jobs[job.id] = job
+        self._queue.put(job)
+        return job
+
+    def get(self, id):
+        """ Get a job by its id or ``None`` if it does not exist
+        """
+        with self._lock:
+            return self.jobs.get(id)
+
+    def all_jobs(self):
+        """ List all jobs in order of submission
+        """
+        with self._lock:
+            return [self.jobs[id] for id in sorted(self.jobs)]
+
+    def fetch(self, url, filename, info=None, overwrite=True):
+        """ Download a single DOI with the warm browser, see
+        :func:`papget.batch.fetch`
+
+        Args:
+            url (str):
+                    DOI in URL format
+            filename (str):
+                    Where to store the PDF
+            info (Optional[str]):
+                    Info file to write after a successful download
+            overwrite (Optional[bool]):
+                    If false, an existing PDF is kept and the
+                    download skipped.
+
+        Returns:
+            dict:   Result of the download
+        """
+        if not overwrite and os.path.isfile(filename):
+            result = batch.Result(doi=url, provider=None, url=None,
+                                  filename=filename,
+                                  size=os.path.getsize(filename),
+                                  timings={}, error=None)
+            return dict(result._asdict(), skipped=True)
+        result = batch.fetch(url, filename, self.browser, self.targets)
+        if info and result.filename:
+            network = papget.NETWORK.name if papget.NETWORK else None
+            bib.write_info(bib.info_record(url, result.url, result.provider,
+                                           network), info)
+        return dict(result._asdict(), skipped=False)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            job.status = 'running'
+            try:
+                for url, filename, info in job.downloads:
+                    job.results.append(self.fetch(url, filename, info,
+                                                  job.overwrite))
+                if papget.NETWORK:
+                    papget.NETWORK.save()
+            except Exception as e:
+                job.error = '{}'.format(e)
+            failed = all(r['filename'] is None for r in job.results)
+            failed = job.error or (job.results and failed)
+            job.status = 'failed' if failed else 'done'
+
+def parse_job(spec):
+    """ Validate the body of a ``POST /jobs`` request
+
+    Args:
+        spec (dict):
+                Decoded JSON body
+
+    Returns:
+        dict:   Keyword arguments for :func:`Service.submit`
+
+    Raises:
+        ValueError: if the body is malformed or contains relative paths
+
+    Example:
+        >>> kwargs = parse_job({'dois': ['https://doi.org/10.1109/5.771073'],
+        ...                     'directory': '/tmp'})
+        >>> sorted(kwargs) == ['bibs', 'directory', 'dois', 'overwrite']
+        True
+        >>> parse_job({'dois': 'https://doi.org/10.1109/5.771073',
+        ...            'directory': '/tmp'})
+        Traceback (most recent call last):
+        ...
+        ValueError: dois must be a list of strings
+        >>> parse_job({'directory': 'papers'})
+        Traceback (most recent call last):
+        ...
+        ValueError: directory must be an absolute path
+    """
+    if not isinstance(spec, dict):
+        raise ValueError('expected a JSON object')
+    kwargs = {}
+    for key in ('dois', 'bibs'):
+        value = spec.get(key, [])
+        if (not isinstance(value, list)
+                or not all(isinstance(v, STRING_TYPES) for v in value)):
+            raise ValueError('{} must be a list of strings'.format(key))
+        kwargs[key] = value
+    if not all(os.path.isabs(bib) for bib in kwargs['bibs']):
+        raise ValueError('bibs must be absolute paths')
+    directory = spec.get('directory')
+    if not isinstance(directory, STRING_TYPES) or not os.path.isabs(directory):
+        raise ValueError('directory must be an absolute path')
+    kwargs['directory'] = directory
+    overwrite = spec.get('overwrite', True)
+    if not isinstance(overwrite, bool):
+        raise ValueError('overwrite must be a boolean')
+    kwargs['overwrite'] = overwrite
+    return kwargs
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """ Translates HTTP requests into calls of :class:`Service`
+    """
+    def do_GET(self):
+        service = self.server.service
+        parts = self.path.strip('/').split('/')
+        if parts == ['jobs']:
+            jobs = [j.to_dict() for j in service.all_jobs()]
+            return self._reply(200, jobs)
+        if len(parts) == 2 and parts[0] == 'jobs' and parts[1].isdigit():
+            job = service.get(int(parts[1]))
+            if job:
+                return self._reply(200, job.to_dict())
+        self._reply(404, dict(error='not found'))
+
+    def do_POST(self):
+        if self.path.strip('/') != 'jobs':
+            return self._reply(404, dict(error='not found'))
+        content_type = self.headers.get('Content-Type', '')
+        if content_type.split(';')[0].strip() != 'application/json':
+            return self._reply(415, dict(error='expected application/json'))
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            spec = json.loads(self.rfile.read(length).decode('utf-8'))
+            job = self.server.service.submit(**parse_job(spec))
+        except (ValueError, IOError, OSError) as e:
+            return self._reply(400, dict(error='{}'.format(e)))
+        except Exception as e:
+            return self._reply(500, dict(error='{}'.format(e)))
+        self._reply(202, job.to_dict())
+
+    def _reply(self, code, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(host=HOST, port=PORT, service=None):
+    """ Run the HTTP/JSON API until interrupted
+
+    Args:
+        host (Optional[str]):
+                Address to listen on. Defaults to localhost.
+        port (Optional[int]):
+                Port to listen on
+        service (Optional[:class:`Service`]):
+                If no service is provided, a new instance
+                will be created.
+    """
+    service = service or Service()
+    service.start()
+    server = HTTPServer((host, port), RequestHandler)
+    server.service = service
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
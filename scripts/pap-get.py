@@ -4,14 +4,17 @@
 from __future__ import division, print_function, absolute_import
 
 import os
+from functools import partial
 
 import click
-import yaml
-import datetime as dt
 
 import bibtexparser as bibtex
 
+import papget.bib
 import papget.doi
+import papget.network
+import papget.profiling
+import papget.service
 
 @click.command()
 @click.option('--info/--no-info', default=True,
@@ -23,13 +26,67 @@ import papget.doi
 @click.option('--network', default=None,
               help='Which network are you currently using, '
                    'TU Wien etc.?')
+@click.option('--proxy', default=None,
+              help='Proxy to remember for the network, e.g. '
+                   'user:password@proxy.example.org:3128')
+@click.option('--memory-budget', default=None,
+              type=click.IntRange(min=1),
+              help='Maximum MiB held by in-flight downloads and '
+                   'parsed pages.')
+@click.option('--serve', is_flag=True, default=False,
+              help='Run as a service accepting download jobs '
+                   'over a local HTTP/JSON API.')
+@click.option('--port', default=papget.service.PORT,
+              help='Port the service listens on.')
+@click.option('--profile', default=None, type=click.Path(),
+              help='Write a CPU profile and a wall-clock breakdown '
+                   'to PROFILE.txt and sampled stacks to '
+                   'PROFILE.collapsed.')
 @click.argument('files', nargs=-1, type=click.Path())
-def main(info=True, overwrite=True, debug=False, files=None, network=None):
+def main(info=True, overwrite=True, debug=False, files=None, network=None,
+         serve=False, port=papget.service.PORT, memory_budget=None,
+         proxy=None, profile=None):
     """ Small script for downloading papers from bibtex files
     """
-    files = filter(lambda f: os.path.splitext(f)[-1] == '.bib', files)
-    if len(files) == 0:
-        return
+    if proxy and not network:
+        raise click.UsageError('--proxy requires --network')
+    if network:
+        try:
+            net = papget.network.NetworkProfile(network)
+        except ValueError as e:
+            raise click.UsageError(str(e))
+        if proxy:
+            net.proxies = dict(http=proxy, https=proxy)
+            net.save()
+        papget.papget.NETWORK = net
+    if memory_budget:
+        papget.BUDGET.limit = memory_budget * 1024 ** 2
+    if serve:
+        click.echo('Listening on http://{}:{}/jobs'.format(
+            papget.service.HOST, port))
+        task = partial(papget.service.serve, port=port)
+    else:
+        files = filter(lambda f: os.path.splitext(f)[-1] == '.bib', files)
+        if len(files) == 0:
+            return
+        task = partial(download, files, info, overwrite, debug, network)
+    if profile:
+        # The service runs until interrupted, the report is written then
+        try:
+            with papget.profiling.profile(profile):
+                task()
+        finally:
+            click.echo('Profile written to {0}.txt and {0}.collapsed'.format(
+                profile))
+    else:
+        task()
+    if network:
+        net.save()
+    if memory_budget:
+        click.echo('Memory high-water mark: {:.1f} MiB'.format(
+            papget.BUDGET.high_water / 1024 ** 2))
+
+def download(files, info=True, overwrite=True, debug=False, network=None):
     browser = papget.Provider.get_browser()
     with click.progressbar(files) as ff:
         for f in ff:
@@ -40,25 +97,16 @@ def main(info=True, overwrite=True, debug=False, files=None, network=None):
             urls = [e['url'] for e in has_url]
             for url in urls:
                 succ = False
-                fn = name_format(f)
+                fn = papget.bib.name_format(f)
                 if not overwrite and os.path.isfile(fn):
                     continue
 
-                d = dict(doi=url,
-                         note='automatically downloaded with '
-                              '<https://github.com/tim6her/papget/>')
-                if network:
-                    d['network'] = network
-                target, provider = get_target(url, browser)
-                d['url'] = target
-                d['provider'] = provider.NAME
+                target, provider = papget.doi.get_target(url, browser)
+                name = provider.NAME
 
                 if debug:
                     click.echo(f)
                     click.echo(provider.NAME)
-                fn = name_format(f)
-                if not overwrite and os.path.isfile(fn):
-                    continue
 
                 try:
                     succ = provider.papget(target, fn)
@@ -69,48 +117,20 @@ def main(info=True, overwrite=True, debug=False, files=None, network=None):
                 if not succ:
                     try:
                         succ = try_scihub(url, f)
-                        d['provider'] = papget.SciHub.NAME
+                        name = papget.SciHub.NAME
                     except BaseException as e:
                         if debug:
                             raise e
                         click.echo(e)
-                if succ:
-                    d['date'] = dt.datetime.now().strftime('%Y-%m-%d')
-                    desc = 'automatically downloaded by tim6her on {}, {}'
-                    desc = desc.format(d['date'], d['url'])
-                    d['short description'] = desc
-                    if info:
-                        fn = name_format(f, ext='info')
-                        write_info(d, fn)
+                if succ and info:
+                    d = papget.bib.info_record(url, target, name, network)
+                    fn = papget.bib.name_format(f, ext='info')
+                    papget.bib.write_info(d, fn)
 
 
 def try_scihub(url, f, browser=None):
-    fn = name_format(f)
+    fn = papget.bib.name_format(f)
     return papget.SciHub.papget(url, fn, browser)
 
-def write_info(d, filename):
-    if os.path.isfile(filename):
-        with open(filename, 'r') as info:
-            d_info = yaml.load(info)
-    else:
-        d_info = {}
-    d_info['download'] = d
-    with open(filename, 'w') as info:
-        yaml.safe_dump(d_info, info,
-                       default_flow_style=False)
-
-def get_target(url, browser=None):
-    target = papget.doi.resolve_doi(url, browser)
-
-    for provider in papget.ALL_PROVIDERS:
-        if provider.RE_URL.search(target):
-            return target, provider
-    return url, papget.SciHub
-
-def name_format(bib_name, style='shelah', ext='pdf'):
-    fn = os.path.basename(bib_name)
-    nr = fn.split('-')[0]
-    return '{}.{}'.format(nr, ext)
-
 if __name__ == '__main__':
     main()
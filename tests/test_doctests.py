@@ -1,16 +1,31 @@
 import doctest
 import unittest
 
+import papget.batch
+import papget.bib
 import papget.doi
+import papget.network
 import papget.papget
+import papget.profiling
+import papget.service
 
 suite = unittest.TestSuite()
 
 flags = doctest.NORMALIZE_WHITESPACE + doctest.ELLIPSIS
+suite.addTest(doctest.DocTestSuite(papget.batch,
+                                   optionflags=flags))
+suite.addTest(doctest.DocTestSuite(papget.bib,
+                                   optionflags=flags))
 suite.addTest(doctest.DocTestSuite(papget.doi,
                                    optionflags=flags))
+suite.addTest(doctest.DocTestSuite(papget.network,
+                                   optionflags=flags))
 suite.addTest(doctest.DocTestSuite(papget.papget,
                                    optionflags=flags))
+suite.addTest(doctest.DocTestSuite(papget.profiling,
+                                   optionflags=flags))
+suite.addTest(doctest.DocTestSuite(papget.service,
+                                   optionflags=flags))
 
 runner = unittest.TextTestRunner(verbosity=2)
 runner.run(suite)